@@ -1,5 +1,8 @@
+import asyncio
+import contextlib
 import logging
 import os
+from collections import deque
 from datetime import datetime, date
 from calendar import monthcalendar, month_name
 
@@ -12,13 +15,16 @@ from telegram import (
     MenuButtonCommands,
 )
 from telegram.constants import ParseMode
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
 from telegram.ext import (
     Application,
+    ApplicationHandlerStop,
     CallbackQueryHandler,
     CommandHandler,
     ConversationHandler,
     MessageHandler,
     ContextTypes,
+    TypeHandler,
     filters,
 )
 
@@ -64,6 +70,26 @@ def is_admin(update: Update) -> bool:
     )
 
 logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of recent update/callback query IDs kept for deduplication
+JOURNAL_SIZE = 1024
+# Update IDs this far below the saved mark mean Telegram reset its counter.
+# Replays after a restart only cover the last getUpdates batch (at most 100
+# updates), so they always sit well within this gap.
+UPDATE_ID_RESET_GAP = 1000
+# Seconds between background outbox flushes
+OUTBOX_FLUSH_INTERVAL = 5
+
+_journal: deque = deque(maxlen=JOURNAL_SIZE)
+_journal_keys: set = set()
+# Updates at or below this ID were handled before the last restart. Only
+# applies until the first newer update arrives.
+_replay_floor = 0
+_last_update_id = 0
+# Outbox rows currently being sent by a handler, skipped by the sender
+_outbox_in_flight: set = set()
+_outbox_lock = asyncio.Lock()
 
 TITLE, DESCRIPTION, DATE_PICKER, TIME, LOCATION, DELETE_CHOOSE, DELETE_CONFIRM, REMOVE_ADMIN_CHOOSE = range(8)
 
@@ -77,6 +103,86 @@ HELP_TEXT = (
 )
 
 
+def _remember(key) -> bool:
+    """Add key to the journal, returning False if it was already there."""
+    if key in _journal_keys:
+        return False
+    if len(_journal) == _journal.maxlen:
+        _journal_keys.discard(_journal[0])
+    _journal.append(key)
+    _journal_keys.add(key)
+    return True
+
+
+def _update_keys(update: Update) -> list:
+    keys = [("update", update.update_id)]
+    if update.callback_query:
+        keys.append(("callback", update.callback_query.id))
+    return keys
+
+
+async def dedup_updates(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drop updates that were already processed (polling restarts, webhook retries)."""
+    global _replay_floor, _last_update_id
+    if update.update_id < max(_replay_floor, _last_update_id) - UPDATE_ID_RESET_GAP:
+        # Telegram picks a random update_id after a week without updates
+        logger.info("Update IDs were reset, restarting journal at %s", update.update_id)
+        _journal.clear()
+        _journal_keys.clear()
+        _replay_floor = 0
+        _last_update_id = 0
+        database.reset_last_update_id(update.update_id - 1)
+    elif update.update_id <= _replay_floor:
+        raise ApplicationHandlerStop
+    else:
+        _replay_floor = 0
+    if not all([_remember(key) for key in _update_keys(update)]):
+        raise ApplicationHandlerStop
+
+
+async def mark_update_processed(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Advance the high-water mark after the other handler groups have run."""
+    global _last_update_id
+    _last_update_id = max(_last_update_id, update.update_id)
+
+
+async def flush_outbox(bot) -> None:
+    """Send queued outbound messages, removing each one once delivered."""
+    async with _outbox_lock:
+        for message_id, chat_id, text in database.list_outbox():
+            # Re-check each row: a handler may have sent and deleted it while
+            # earlier rows were being sent
+            if message_id in _outbox_in_flight or not database.has_outbox_message(message_id):
+                continue
+            try:
+                await bot.send_message(chat_id, text)
+            except (Forbidden, BadRequest) as exc:
+                # Blocked bot or deleted chat: retrying will never succeed
+                logger.warning("Dropping outbox message %s for chat %s: %s", message_id, chat_id, exc)
+            except RetryAfter as exc:
+                logger.warning("Flood control, retrying outbox in %s seconds", exc.retry_after)
+                await asyncio.sleep(exc.retry_after)
+                return
+            except TelegramError:
+                logger.exception("Failed to send outbox message %s", message_id)
+                return
+            database.delete_outbox_message(message_id)
+
+
+async def outbox_sender(application: Application) -> None:
+    """Periodically flush the outbox and persist the update high-water mark."""
+    persisted = _replay_floor
+    while True:
+        await asyncio.sleep(OUTBOX_FLUSH_INTERVAL)
+        try:
+            await flush_outbox(application.bot)
+            if _last_update_id and _last_update_id != persisted:
+                database.record_update(_last_update_id)
+                persisted = _last_update_id
+        except Exception:
+            logger.exception("Outbox sender failed")
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     keyboard = [
         [InlineKeyboardButton("Schedule event", callback_data="schedule")],
@@ -371,15 +477,26 @@ async def receive_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def receive_location(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["location"] = update.message.text
 
-    database.add_event(
+    reply = "Event saved!"
+    outbox_id = database.add_event(
         update.message.chat_id,
         context.user_data["title"],
         context.user_data["description"],
         context.user_data["date"],
         context.user_data["time"],
         context.user_data["location"],
+        update_id=update.update_id,
+        reply=reply,
     )
-    await update.message.reply_text("Event saved!")
+    # Send this reply directly; the outbox sender retries it if that fails
+    _outbox_in_flight.add(outbox_id)
+    try:
+        await update.message.reply_text(reply)
+        database.delete_outbox_message(outbox_id)
+    except TelegramError:
+        logger.exception("Failed to send outbox message %s", outbox_id)
+    finally:
+        _outbox_in_flight.discard(outbox_id)
     # Show the main menu again so the user can immediately view events
     await start(update, context)
     return ConversationHandler.END
@@ -475,13 +592,33 @@ async def setup_bot(application: Application) -> None:
     )
     # Ensure users always see a button that opens the command list
     await application.bot.set_chat_menu_button(menu_button=MenuButtonCommands())
+    # Deliver replies left in the outbox by a previous run, then keep flushing
+    await flush_outbox(application.bot)
+    application.bot_data["outbox_task"] = asyncio.create_task(outbox_sender(application))
 
 
-def main():
-    database.init_db()
+async def stop_bot(application: Application) -> None:
+    """Stop the outbox sender, flush the outbox and persist the latest processed update."""
+    task = application.bot_data.pop("outbox_task", None)
+    if task:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await flush_outbox(application.bot)
+    if _last_update_id:
+        database.record_update(_last_update_id)
+
+
+def build_application() -> Application:
+    """Create the application and register all handlers."""
     application = (
-        Application.builder().token(TOKEN).post_init(setup_bot).build()
+        Application.builder()
+        .token(TOKEN)
+        .post_init(setup_bot)
+        .post_stop(stop_bot)
+        .build()
     )
+    application.add_handler(TypeHandler(Update, dedup_updates), group=-1)
 
     conv_handler = ConversationHandler(
         entry_points=[CallbackQueryHandler(button, pattern="^(schedule|show)$"), CommandHandler("schedule", schedule_command)],
@@ -521,8 +658,15 @@ def main():
         fallbacks=[CommandHandler("cancel", cancel)],
     )
     application.add_handler(remove_admin_conv_handler)
+    application.add_handler(TypeHandler(Update, mark_update_processed), group=1)
+    return application
+
 
-    application.run_polling()
+def main():
+    global _replay_floor
+    database.init_db()
+    _replay_floor = database.get_last_update_id()
+    build_application().run_polling()
 
 
 if __name__ == "__main__":
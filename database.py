@@ -32,19 +32,118 @@ def init_db():
         UNIQUE(event_id, username)
     )"""
     )
+    # High-water mark of processed Telegram update IDs (single row)
+    c.execute(
+        """CREATE TABLE IF NOT EXISTS update_journal (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_update_id INTEGER NOT NULL
+    )"""
+    )
+    # Outbound messages committed together with the writes that produced them
+    c.execute(
+        """CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        text TEXT NOT NULL
+    )"""
+    )
+    conn.commit()
+    conn.close()
+
+
+def _record_update(c, update_id: int | None):
+    if update_id is None:
+        return
+    c.execute(
+        "INSERT INTO update_journal (id, last_update_id) VALUES (1, ?) "
+        "ON CONFLICT(id) DO UPDATE SET last_update_id = MAX(last_update_id, excluded.last_update_id)",
+        (update_id,),
+    )
+
+
+def record_update(update_id: int):
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    _record_update(c, update_id)
+    conn.commit()
+    conn.close()
+
+
+def reset_last_update_id(update_id: int):
+    """Overwrite the mark, e.g. after Telegram restarted its update IDs."""
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute(
+        "INSERT OR REPLACE INTO update_journal (id, last_update_id) VALUES (1, ?)",
+        (update_id,),
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_last_update_id() -> int:
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("SELECT last_update_id FROM update_journal WHERE id=1")
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+
+def list_outbox():
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("SELECT id, chat_id, text FROM outbox ORDER BY id")
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+
+def has_outbox_message(message_id: int) -> bool:
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM outbox WHERE id=?", (message_id,))
+    row = c.fetchone()
+    conn.close()
+    return row is not None
+
+
+def delete_outbox_message(message_id: int):
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("DELETE FROM outbox WHERE id=?", (message_id,))
     conn.commit()
     conn.close()
 
 
-def add_event(chat_id: int, title: str, description: str, date: str, time: str, location: str):
+def add_event(
+    chat_id: int,
+    title: str,
+    description: str,
+    date: str,
+    time: str,
+    location: str,
+    update_id: int | None = None,
+    reply: str | None = None,
+):
+    """Insert an event, its queued reply and the update ID in one transaction.
+
+    Returns the outbox row ID of the reply, or None if no reply was given.
+    """
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
     c.execute(
         "INSERT INTO events (chat_id, title, description, date, time, location) VALUES (?, ?, ?, ?, ?, ?)",
         (chat_id, title, description, date, time, location),
     )
+    outbox_id = None
+    if reply is not None:
+        c.execute("INSERT INTO outbox (chat_id, text) VALUES (?, ?)", (chat_id, reply))
+        outbox_id = c.lastrowid
+    _record_update(c, update_id)
     conn.commit()
     conn.close()
+    return outbox_id
 
 
 def list_events(chat_id: int):
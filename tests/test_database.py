@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+
+def test_add_event_writes_event_outbox_and_mark(db):
+    outbox_id = db.add_event(1, "Picnic", "Bring food", "01.06.2026", "12:00", "Park", update_id=10, reply="Event saved!")
+    assert db.list_events(1) == [("Picnic", "Bring food", "01.06.2026", "12:00", "Park")]
+    assert db.list_outbox() == [(outbox_id, 1, "Event saved!")]
+    assert db.get_last_update_id() == 10
+
+
+def test_add_event_is_atomic(db, monkeypatch):
+    real_record = db._record_update
+
+    def failing_record(c, update_id):
+        real_record(c, update_id)
+        raise sqlite3.OperationalError("boom")
+
+    monkeypatch.setattr(db, "_record_update", failing_record)
+    with pytest.raises(sqlite3.OperationalError):
+        db.add_event(1, "Picnic", "", "01.06.2026", "12:00", "Park", update_id=10, reply="Event saved!")
+    assert db.list_events(1) == []
+    assert db.list_outbox() == []
+    assert db.get_last_update_id() == 0
+
+
+def test_add_event_without_reply(db):
+    assert db.add_event(1, "Picnic", "", "01.06.2026", "12:00", "Park") is None
+    assert db.list_outbox() == []
+
+
+def test_record_update_never_lowers_mark(db):
+    db.record_update(20)
+    db.record_update(5)
+    assert db.get_last_update_id() == 20
+
+
+def test_reset_last_update_id_lowers_mark(db):
+    db.record_update(20)
+    db.reset_last_update_id(5)
+    assert db.get_last_update_id() == 5
+
+
+def test_outbox_drains_in_insertion_order(db):
+    first = db.add_event(1, "A", "", "01.06.2026", "12:00", "Park", reply="first")
+    second = db.add_event(2, "B", "", "01.06.2026", "13:00", "Park", reply="second")
+    assert [row[0] for row in db.list_outbox()] == [first, second]
+    db.delete_outbox_message(first)
+    assert db.list_outbox() == [(second, 2, "second")]
+
+
+def test_has_outbox_message(db):
+    outbox_id = db.add_event(1, "A", "", "01.06.2026", "12:00", "Park", reply="saved")
+    assert db.has_outbox_message(outbox_id)
+    db.delete_outbox_message(outbox_id)
+    assert not db.has_outbox_message(outbox_id)
@@ -0,0 +1,269 @@
+import asyncio
+import sqlite3
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telegram")
+
+import bot  # noqa: E402
+from telegram import Update, User  # noqa: E402
+from telegram.error import Forbidden, NetworkError  # noqa: E402
+from telegram.ext import ApplicationHandlerStop, ExtBot  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def journal(db, monkeypatch):
+    monkeypatch.setattr(bot, "_journal", deque(maxlen=bot.JOURNAL_SIZE))
+    monkeypatch.setattr(bot, "_journal_keys", set())
+    monkeypatch.setattr(bot, "_outbox_in_flight", set())
+    monkeypatch.setattr(bot, "_replay_floor", 0)
+    monkeypatch.setattr(bot, "_last_update_id", 0)
+
+
+def make_update(update_id, callback_id=None):
+    query = SimpleNamespace(id=callback_id) if callback_id else None
+    return SimpleNamespace(update_id=update_id, callback_query=query)
+
+
+def dedup(update):
+    asyncio.run(bot.dedup_updates(update, None))
+
+
+def test_remember_evicts_oldest_at_journal_size():
+    for i in range(bot.JOURNAL_SIZE):
+        assert bot._remember(i)
+    assert not bot._remember(0)
+    assert bot._remember(bot.JOURNAL_SIZE)
+    assert len(bot._journal_keys) == bot.JOURNAL_SIZE
+    assert bot._remember(0)
+
+
+def test_duplicate_update_and_callback_are_dropped():
+    dedup(make_update(1, "cb"))
+    with pytest.raises(ApplicationHandlerStop):
+        dedup(make_update(1))
+    with pytest.raises(ApplicationHandlerStop):
+        dedup(make_update(2, "cb"))
+
+
+def test_replay_floor_ends_at_first_newer_update(monkeypatch):
+    monkeypatch.setattr(bot, "_replay_floor", 100)
+    with pytest.raises(ApplicationHandlerStop):
+        dedup(make_update(99))
+    dedup(make_update(101))
+    assert bot._replay_floor == 0
+    dedup(make_update(50))
+
+
+def test_id_far_below_floor_is_treated_as_reset(db, monkeypatch):
+    db.record_update(5000)
+    monkeypatch.setattr(bot, "_replay_floor", 5000)
+    bot._remember(("update", 3000))
+    dedup(make_update(5000 - bot.UPDATE_ID_RESET_GAP - 1))
+    assert bot._replay_floor == 0
+    assert db.get_last_update_id() == 5000 - bot.UPDATE_ID_RESET_GAP - 2
+    assert ("update", 3000) not in bot._journal_keys
+
+
+class FakeBot:
+    def __init__(self, errors=None):
+        self.sent = []
+        self.errors = errors or {}
+
+    async def send_message(self, chat_id, text):
+        if chat_id in self.errors:
+            raise self.errors[chat_id]
+        self.sent.append((chat_id, text))
+
+
+def add_reply(db, chat_id, text):
+    return db.add_event(chat_id, "A", "", "01.06.2026", "12:00", "Park", reply=text)
+
+
+def test_flush_outbox_drops_permanent_failures(db):
+    add_reply(db, 1, "blocked")
+    add_reply(db, 2, "ok")
+    fake = FakeBot({1: Forbidden("blocked")})
+    asyncio.run(bot.flush_outbox(fake))
+    assert fake.sent == [(2, "ok")]
+    assert db.list_outbox() == []
+
+
+def test_flush_outbox_stops_on_transient_failure(db):
+    add_reply(db, 1, "first")
+    add_reply(db, 2, "second")
+    fake = FakeBot({1: NetworkError("down")})
+    asyncio.run(bot.flush_outbox(fake))
+    assert fake.sent == []
+    assert len(db.list_outbox()) == 2
+
+
+def test_flush_outbox_skips_in_flight_rows(db):
+    in_flight = add_reply(db, 1, "handler")
+    add_reply(db, 2, "sender")
+    bot._outbox_in_flight.add(in_flight)
+    fake = FakeBot()
+    asyncio.run(bot.flush_outbox(fake))
+    assert fake.sent == [(2, "sender")]
+    assert [row[0] for row in db.list_outbox()] == [in_flight]
+
+
+def test_receive_location_concurrent_with_flush_sends_reply_once(db):
+    add_reply(db, 9, "stale")
+    sent = []
+
+    async def scenario():
+        sender_sending = asyncio.Event()
+        handler_done = asyncio.Event()
+
+        async def reply_text(text, **kwargs):
+            await sender_sending.wait()
+            sent.append(("handler", 1, text))
+
+        class SlowBot:
+            async def send_message(self, chat_id, text):
+                sender_sending.set()
+                await handler_done.wait()
+                sent.append(("sender", chat_id, text))
+
+        update = SimpleNamespace(
+            update_id=1,
+            message=SimpleNamespace(chat_id=1, text="Park", reply_text=reply_text),
+            effective_user=SimpleNamespace(username="ana"),
+        )
+        context = SimpleNamespace(
+            user_data={"title": "Picnic", "description": "", "date": "01.06.2026", "time": "12:00"}
+        )
+
+        async def run_handler():
+            await bot.receive_location(update, context)
+            handler_done.set()
+
+        handler = asyncio.create_task(run_handler())
+        await asyncio.sleep(0)
+        # The sender's snapshot includes the handler's row, which is in flight
+        await asyncio.gather(bot.flush_outbox(SlowBot()), handler)
+
+    asyncio.run(scenario())
+    assert [entry for entry in sent if entry[2] == "Event saved!"] == [("handler", 1, "Event saved!")]
+    assert ("sender", 9, "stale") in sent
+    assert db.list_outbox() == []
+
+
+def test_outbox_sender_survives_errors(monkeypatch):
+    monkeypatch.setattr(bot, "OUTBOX_FLUSH_INTERVAL", 0)
+    calls = []
+
+    async def flaky_flush(_bot):
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        if len(calls) == 3:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(bot, "flush_outbox", flaky_flush)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(bot.outbox_sender(SimpleNamespace(bot=None)))
+    assert len(calls) == 3
+
+
+def test_stop_bot_flushes_outbox_and_saves_mark(db, monkeypatch):
+    monkeypatch.setattr(bot, "OUTBOX_FLUSH_INTERVAL", 3600)
+    monkeypatch.setattr(bot, "_last_update_id", 42)
+    add_reply(db, 1, "pending")
+    fake = FakeBot()
+
+    async def scenario():
+        application = SimpleNamespace(bot=fake, bot_data={})
+        application.bot_data["outbox_task"] = asyncio.create_task(bot.outbox_sender(application))
+        await asyncio.sleep(0)
+        await bot.stop_bot(application)
+        return application
+
+    application = asyncio.run(scenario())
+    assert "outbox_task" not in application.bot_data
+    assert fake.sent == [(1, "pending")]
+    assert db.get_last_update_id() == 42
+
+
+USER = {"id": 7, "is_bot": False, "first_name": "Ana", "username": "ana"}
+CHAT = {"id": 1, "type": "private"}
+
+
+@pytest.fixture
+def telegram_calls(monkeypatch):
+    """Replace Telegram API calls with fakes that record sent texts."""
+    calls = SimpleNamespace(sent=[], fail_texts=set())
+
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(1, "Bot", True, username="test_bot")
+        return self._bot_user
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        if text in calls.fail_texts:
+            raise NetworkError("down")
+        calls.sent.append(text)
+
+    async def no_op(self, *args, **kwargs):
+        return True
+
+    monkeypatch.setattr(ExtBot, "get_me", get_me)
+    monkeypatch.setattr(ExtBot, "send_message", send_message)
+    monkeypatch.setattr(ExtBot, "answer_callback_query", no_op)
+    monkeypatch.setattr(ExtBot, "edit_message_text", no_op)
+    return calls
+
+
+def message_update(application, update_id, text):
+    message = {"message_id": update_id, "date": 0, "chat": CHAT, "from": USER, "text": text}
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return Update.de_json({"update_id": update_id, "message": message}, application.bot)
+
+
+def callback_update(application, update_id, data):
+    message = {"message_id": 100, "date": 0, "chat": CHAT, "from": USER, "text": "Select a date:"}
+    query = {"id": f"cq{update_id}", "from": USER, "chat_instance": "ci", "data": data, "message": message}
+    return Update.de_json({"update_id": update_id, "callback_query": query}, application.bot)
+
+
+def process(updates_factory):
+    async def scenario():
+        application = bot.build_application()
+        await application.initialize()
+        try:
+            for update in updates_factory(application):
+                await application.process_update(update)
+        finally:
+            await application.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_update_is_dropped_by_process_update(telegram_calls):
+    process(lambda app: [message_update(app, 1, "/start"), message_update(app, 1, "/start")])
+    assert telegram_calls.sent == ["Choose an option:"]
+    assert bot._last_update_id == 1
+
+
+def test_failing_handler_after_commit_does_not_duplicate_event(db, telegram_calls):
+    telegram_calls.fail_texts.add("Choose an option:")
+
+    def updates(app):
+        location = message_update(app, 6, "Park")
+        return [
+            message_update(app, 1, "/schedule"),
+            message_update(app, 2, "Picnic"),
+            message_update(app, 3, "Bring food"),
+            callback_update(app, 4, "day:2026-06-01"),
+            message_update(app, 5, "12:00"),
+            location,
+            location,
+        ]
+
+    process(updates)
+    assert db.list_events(1) == [("Picnic", "Bring food", "01.06.2026", "12:00", "Park")]
+    assert telegram_calls.sent.count("Event saved!") == 1
+    assert db.list_outbox() == []